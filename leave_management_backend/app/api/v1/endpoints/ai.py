@@ -64,10 +64,10 @@ def suggest_responsible_person(
     current_user: User = Depends(get_current_user)
 ):
     """Suggest suitable colleagues to handle responsibilities"""
-    from datetime import datetime
+    from datetime import date
     
-    start = datetime.strptime(start_date, "%Y-%m-%d").date()
-    end = datetime.strptime(end_date, "%Y-%m-%d").date()
+    start = date.fromisoformat(start_date)
+    end = date.fromisoformat(end_date)
     
     # Get colleagues in same department
     colleagues = db.query(User).filter(
@@ -1,3 +1,4 @@
+import logging
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from typing import List
@@ -6,11 +7,12 @@ from app.database import get_db
 from app.models.user import User, UserRole
 from app.models.leave import Leave, LeaveStatus
 from app.api.deps import get_current_manager
-from app.services.ai_service import AIService
+from app.services.unified_ai_service import UnifiedAIService, LeaveImpactInput
 from app.services.policy_rag_service import PolicyRAGService
 from app.config import settings
 from app.schemas.leave import LeaveResponse, LeaveApproval
 
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -31,21 +33,20 @@ def get_pending_leaves(
         Leave.status == LeaveStatus.PENDING
     ).order_by(Leave.created_at.desc()).all()
     
-    ai_service = AIService()
     rag_service = PolicyRAGService(db, settings.GROQ_API_KEY)
     
+    # Calculate team impact for all pending leaves in one batch
+    team_data = []
+    impacts = UnifiedAIService().calculate_impact_scores_batch(
+        [LeaveImpactInput(start_date=leave.start_date, end_date=leave.end_date) for leave in pending_leaves],
+        team_data
+    )
+    
     results = []
     
-    for leave in pending_leaves:
+    for leave, impact in zip(pending_leaves, impacts):
         employee = db.query(User).filter(User.id == leave.employee_id).first()
         
-        # Calculate team impact
-        team_data = []
-        impact = ai_service.calculate_impact_score({
-            "start_date": leave.start_date,
-            "end_date": leave.end_date
-        }, team_data)
-        
         # CHECK POLICY COMPLIANCE
         policy_compliance = None
         try:
@@ -70,7 +71,7 @@ def get_pending_leaves(
             )
             
         except Exception as e:
-            print(f"Policy compliance check failed for leave {leave.id}: {e}")
+            logger.warning("Policy compliance check failed for leave %s: %s", leave.id, e)
             # Continue without policy check if it fails
             policy_compliance = {
                 "compliant": True,
@@ -10,7 +10,7 @@ from app.services.policy_processor import PolicyProcessor
 from app.services.policy_rag_service import PolicyRAGService
 from app.services.policy_embedding_service import PolicyEmbeddingService
 from app.config import settings
-import json
+import orjson
 from datetime import datetime
 
 router = APIRouter()
@@ -89,7 +89,7 @@ async def upload_policy_document(
                 policy_id=policy.id,
                 chunk_index=chunk_data["index"],
                 content=chunk_data["content"],
-                embedding=json.dumps(embedding),
+                embedding=orjson.dumps(embedding).decode(),
                 section_title=chunk_data.get("section_title")
             )
             db.add(chunk)
@@ -1,3 +1,4 @@
+import logging
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from typing import List, Dict, Optional
@@ -5,10 +6,11 @@ from app.database import get_db
 from app.models.user import User
 from app.models.leave import Leave, LeaveStatus
 from app.api.deps import get_current_user
-from app.services.unified_ai_service import UnifiedAIService
+from app.services.unified_ai_service import LeaveImpactInput, UnifiedAIService, UserCtx
 from app.schemas.leave import ConversationRequest, ConversationResponse
 from app.services.policy_rag_service import PolicyRAGService
 
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -25,15 +27,7 @@ def unified_conversation(
     ai_service = UnifiedAIService()
     
     # Build user context
-    user_context = {
-        "user_id": current_user.id,
-        "role": current_user.role,
-        "department": current_user.department,
-        "position": current_user.position,
-        "full_name": current_user.full_name,
-        "is_manager": current_user.role in ["MANAGER", "HR"],
-        "is_hr": current_user.role == "HR"
-    }
+    user_context = UserCtx.from_user(current_user)
     
     # Parse intent with AI
     parsed = ai_service.parse_conversation(
@@ -45,20 +39,20 @@ def unified_conversation(
     intent = parsed["intent"]
     
     # ROLE-BASED INTENT CORRECTION
-    if intent == "APPROVE_REJECT" and not user_context["is_manager"]:
+    if intent == "APPROVE_REJECT" and not user_context.is_manager:
         parsed["intent"] = "QUERY_LEAVES"
         if not parsed.get("status"):
             parsed["status"] = "PENDING"
         if not parsed.get("employee_name"):
-            parsed["employee_name"] = user_context["full_name"]
+            parsed["employee_name"] = user_context.full_name
         intent = "QUERY_LEAVES"
-        print(f"Intent corrected from APPROVE_REJECT to QUERY_LEAVES for employee {user_context['full_name']}")
+        logger.debug("Intent corrected from APPROVE_REJECT to QUERY_LEAVES for employee %s", user_context.full_name)
     
-    if intent == "TEAM_STATUS" and not user_context["is_manager"]:
+    if intent == "TEAM_STATUS" and not user_context.is_manager:
         parsed["intent"] = "QUERY_LEAVES"
         intent = "QUERY_LEAVES"
     
-    if intent == "ANALYTICS" and not user_context["is_hr"]:
+    if intent == "ANALYTICS" and not user_context.is_hr:
         parsed["intent"] = "QUERY_LEAVES"
         intent = "QUERY_LEAVES"
     
@@ -68,7 +62,7 @@ def unified_conversation(
             result = _handle_leave_request(db, current_user, parsed, ai_service)
         
         elif intent == "APPROVE_REJECT":
-            if not user_context["is_manager"]:
+            if not user_context.is_manager:
                 raise HTTPException(
                     status_code=403, 
                     detail="Only managers and HR can approve/reject leaves"
@@ -94,7 +88,7 @@ def unified_conversation(
             result = _handle_balance_check(db, current_user, parsed, user_context)
         
         elif intent == "ANALYTICS":
-            if not user_context["is_hr"]:
+            if not user_context.is_hr:
                 raise HTTPException(
                     status_code=403,
                     detail="Only HR can access analytics"
@@ -102,7 +96,7 @@ def unified_conversation(
             result = _handle_analytics(db, parsed)
         
         elif intent == "TEAM_STATUS":
-            if not user_context["is_manager"]:
+            if not user_context.is_manager:
                 raise HTTPException(
                     status_code=403,
                     detail="Only managers and HR can view team status"
@@ -136,15 +130,15 @@ def unified_conversation(
                     action_text = str(action)
                 
                 # Skip approval actions for non-managers
-                if not user_context["is_manager"] and any(approve_word in action_text.lower() for approve_word in ["approve", "reject", "pending approval"]):
+                if not user_context.is_manager and any(approve_word in action_text.lower() for approve_word in ["approve", "reject", "pending approval"]):
                     continue
                     
                 # Skip analytics actions for non-HR
-                if not user_context["is_hr"] and any(analytics_word in action_text.lower() for analytics_word in ["analytics", "trends", "reports"]):
+                if not user_context.is_hr and any(analytics_word in action_text.lower() for analytics_word in ["analytics", "trends", "reports"]):
                     continue
                     
                 # Skip team actions for non-managers
-                if not user_context["is_manager"] and any(team_word in action_text.lower() for team_word in ["team", "department"]):
+                if not user_context.is_manager and any(team_word in action_text.lower() for team_word in ["team", "department"]):
                     continue
                 
                 actions.append(action_text)
@@ -163,7 +157,7 @@ def unified_conversation(
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error in conversation: {e}")
+        logger.exception("Error in conversation: %s", e)
         raise HTTPException(status_code=500, detail="Failed to process request")
 
 
@@ -210,7 +204,7 @@ def _handle_leave_request(
                 # Let employees submit ANY request, managers will enforce policy during approval
                 
         except Exception as e:
-            print(f"Policy compliance check failed: {e}")
+            logger.warning("Policy compliance check failed: %s", e)
             # Continue without policy check if it fails
             policy_compliance = None
     
@@ -278,7 +272,7 @@ def _handle_leave_request(
             })
     
     impact = ai_service.calculate_impact_score(
-        leave_data=parsed,
+        leave_data=LeaveImpactInput.from_dict(parsed),
         team_data=team_data
     )
     
@@ -419,7 +413,7 @@ def _handle_approval(db: Session, current_user: User, parsed: Dict) -> Dict:
                 warnings.extend(policy_compliance.get("warnings", []))
             
         except Exception as e:
-            print(f"Policy compliance check failed during approval: {e}")
+            logger.warning("Policy compliance check failed during approval: %s", e)
             # If policy check fails, allow approval with warning
             warnings.append("Policy compliance check unavailable")
     
@@ -470,7 +464,7 @@ def _handle_leave_query(
     db: Session,
     current_user: User,
     parsed: Dict,
-    user_context: Dict
+    user_context: UserCtx
 ) -> Dict:
     """Handle leave queries with permission filtering"""
     from datetime import date, timedelta
@@ -478,12 +472,12 @@ def _handle_leave_query(
     query = db.query(Leave, User).join(User, Leave.employee_id == User.id)
     
     # Permission-based filtering
-    if not user_context["is_manager"]:
+    if not user_context.is_manager:
         # Regular employees can only see their own leaves
         query = query.filter(Leave.employee_id == current_user.id)
     else:
         # Managers can see their team, HR can see all
-        if user_context["role"] == "MANAGER":
+        if user_context.role == "MANAGER":
             team_members = db.query(User).filter(
                 User.manager_id == current_user.id
             ).all()
@@ -533,7 +527,7 @@ def _handle_leave_query(
             pass
     
     # Other filters
-    if parsed.get("department") and user_context["is_hr"]:
+    if parsed.get("department") and user_context.is_hr:
         query = query.filter(User.department == parsed["department"])
     
     if parsed.get("leave_type"):
@@ -563,7 +557,7 @@ def _handle_balance_check(
     db: Session,
     current_user: User,
     parsed: Dict,
-    user_context: Dict
+    user_context: UserCtx
 ) -> Dict:
     """Handle leave balance queries with permission filtering"""
     from datetime import datetime
@@ -576,9 +570,9 @@ def _handle_balance_check(
     ).filter(LeaveBalance.year == current_year)
     
     # Permission filtering
-    if not user_context["is_manager"]:
+    if not user_context.is_manager:
         query = query.filter(LeaveBalance.employee_id == current_user.id)
-    elif user_context["role"] == "MANAGER":
+    elif user_context.role == "MANAGER":
         team_members = db.query(User).filter(
             User.manager_id == current_user.id
         ).all()
@@ -586,7 +580,7 @@ def _handle_balance_check(
         query = query.filter(LeaveBalance.employee_id.in_(team_ids))
     
     # Department filter (HR only)
-    if parsed.get("department") and user_context["is_hr"]:
+    if parsed.get("department") and user_context.is_hr:
         query = query.filter(User.department == parsed["department"])
     
     results = query.all()
@@ -644,7 +638,7 @@ def _handle_team_status(
     db: Session,
     current_user: User,
     parsed: Dict,
-    user_context: Dict
+    user_context: UserCtx
 ) -> Dict:
     """Handle team status queries"""
     from datetime import date
@@ -654,7 +648,7 @@ def _handle_team_status(
     query = db.query(User)
     
     # Permission-based filtering
-    if user_context["role"] == "MANAGER":
+    if user_context.role == "MANAGER":
         team_members = db.query(User).filter(
             User.manager_id == current_user.id
         ).all()
@@ -669,6 +663,7 @@ def _handle_team_status(
     users = query.all()
     
     team_status = []
+    on_leave_members = []  # Split out here so the reply doesn't re-scan the team
     for user in users:
         on_leave = db.query(Leave).filter(
             Leave.employee_id == user.id,
@@ -677,17 +672,21 @@ def _handle_team_status(
             Leave.end_date >= today
         ).first()
         
-        team_status.append({
+        member = {
             "employee_name": user.full_name,
             "department": user.department,
             "position": user.position,
             "status": "On Leave" if on_leave else "Available",
             "leave_type": on_leave.leave_type.value if on_leave else None
-        })
+        }
+        team_status.append(member)
+        if on_leave:
+            on_leave_members.append(member)
     
     return {
         "team_status": team_status,
+        "on_leave_members": on_leave_members,
         "total": len(team_status),
-        "on_leave": len([s for s in team_status if s["status"] == "On Leave"]),
-        "available": len([s for s in team_status if s["status"] == "Available"])
+        "on_leave": len(on_leave_members),
+        "available": len(team_status) - len(on_leave_members)
     }
\ No newline at end of file
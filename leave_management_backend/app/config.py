@@ -14,6 +14,11 @@ class Settings(BaseSettings):
     GROQ_API_KEY: Optional[str] = None
     OPENAI_API_KEY: Optional[str] = None
     OLLAMA_URL: Optional[str] = "http://localhost:11434/api/generate"
+    # Client-side cap, kept just under the Groq account's requests-per-minute limit
+    GROQ_REQUESTS_PER_MINUTE: int = 29
+    
+    # Logging
+    LOG_LEVEL: str = "WARNING"
     
     class Config:
         env_file = ".env"
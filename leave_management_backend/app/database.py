@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.config import settings
@@ -12,6 +12,13 @@ if database_url.startswith("sqlite"):
         database_url, 
         connect_args={"check_same_thread": False}
     )
+    
+    @event.listens_for(engine, "connect")
+    def _enable_wal(dbapi_connection, connection_record):
+        # Readers don't block the writer (or each other) across threadpool requests
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.close()
 else:
     # For PostgreSQL, don't use check_same_thread
     engine = create_engine(database_url)
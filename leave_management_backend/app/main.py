@@ -1,8 +1,24 @@
+import logging.config
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.v1.api import api_router
+from app.config import settings
 from app.database import init_db
 
+logging.config.dictConfig({
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "default": {"format": "%(asctime)s %(levelname)s %(name)s: %(message)s"}
+    },
+    "handlers": {
+        "console": {"class": "logging.StreamHandler", "formatter": "default"}
+    },
+    "loggers": {
+        "app": {"handlers": ["console"], "level": settings.LOG_LEVEL, "propagate": False}
+    }
+})
+
 app = FastAPI(
     title="Leave Management System",
     description="AI-powered Leave Management System with Natural Language Processing",
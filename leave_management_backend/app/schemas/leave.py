@@ -10,6 +10,7 @@ from app.models.leave import LeaveType, LeaveStatus
 class ChatMessage(BaseModel):
     role: str = Field(..., description="Role: 'user' or 'assistant'")
     content: str = Field(..., description="Message content")
+    data: Optional[Dict[str, Any]] = Field(default=None, description="Structured data sent with assistant turns")
 
 class ConversationRequest(BaseModel):
     message: str = Field(..., description="User's message")
@@ -1,19 +1,32 @@
 # ============================================================================
 # FILE: app/services/ai_service.py (Groq - FREE Version)
 # ============================================================================
+import logging
 from datetime import datetime, timedelta, date
 from typing import Dict, Optional, List
 from app.models.leave import LeaveType
 from app.config import settings  # Import your settings
-import json
+import orjson
 import os
+import re
 import requests
 
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r"[a-z]+")
+_DAYS_RE = re.compile(r"(\d+)\s*day")
+# Fallback leave type keywords, checked in this order
+_LEAVE_TYPE_KEYWORDS = {
+    "sick": LeaveType.SICK, "ill": LeaveType.SICK, "unwell": LeaveType.SICK,
+    "casual": LeaveType.CASUAL, "personal": LeaveType.CASUAL,
+    "annual": LeaveType.ANNUAL, "vacation": LeaveType.ANNUAL
+}
+
 class AIService:
     
     def __init__(self):
         self.groq_api_key = settings.GROQ_API_KEY  # Use settings instead of os.getenv
-        print("GROQ_API_KEY loaded:", "Yes" if self.groq_api_key else "No")
+        logger.debug("GROQ_API_KEY loaded: %s", "Yes" if self.groq_api_key else "No")
         self.api_url = "https://api.groq.com/openai/v1/chat/completions"
     
     def parse_leave_request_with_context(
@@ -32,7 +45,7 @@ class AIService:
         
         system_prompt = f"""You are a helpful assistant that extracts leave request information.
 
-Today's date: {today.strftime('%Y-%m-%d')} ({today.strftime('%A')})
+Today's date: {today.isoformat()} ({today.strftime('%A')})
 
 Extract:
 1. leave_type: SICK, CASUAL, ANNUAL, MATERNITY, PATERNITY, or UNPAID
@@ -41,10 +54,10 @@ Extract:
 4. reason: brief description
 
 Rules:
-- "tomorrow" = {(today + timedelta(days=1)).strftime('%Y-%m-%d')}
+- "tomorrow" = {(today + timedelta(days=1)).isoformat()}
 - "next Monday" = calculate the date
 - "3 days" = assume starting tomorrow unless specified
-- Use previous context: {json.dumps(user_context)}
+- Use previous context: {orjson.dumps(user_context, default=str).decode()}
 
 Respond ONLY with valid JSON:
 {{
@@ -82,19 +95,15 @@ Respond ONLY with valid JSON:
             )
             
             if response.status_code == 200:
-                result = response.json()
-                extracted_data = json.loads(result["choices"][0]["message"]["content"])
+                result = orjson.loads(response.content)
+                extracted_data = orjson.loads(result["choices"][0]["message"]["content"])
                 
                 # Convert string dates to date objects
                 if extracted_data.get("start_date"):
-                    extracted_data["start_date"] = datetime.strptime(
-                        extracted_data["start_date"], "%Y-%m-%d"
-                    ).date()
+                    extracted_data["start_date"] = date.fromisoformat(extracted_data["start_date"])
                 
                 if extracted_data.get("end_date"):
-                    extracted_data["end_date"] = datetime.strptime(
-                        extracted_data["end_date"], "%Y-%m-%d"
-                    ).date()
+                    extracted_data["end_date"] = date.fromisoformat(extracted_data["end_date"])
                 
                 # Convert leave_type to enum
                 if extracted_data.get("leave_type"):
@@ -106,18 +115,17 @@ Respond ONLY with valid JSON:
                 extracted_data = self._check_completeness(extracted_data)
                 return extracted_data
             else:
-                print(f"Groq API Error: {response.status_code} - {response.text}")
+                logger.warning("Groq API Error: %s - %s", response.status_code, response.text)
                 
         except Exception as e:
-            print(f"Error calling Groq API: {e}")
+            logger.warning("Error calling Groq API: %s", e)
         
         return self._fallback_parse(text, user_context)
     
     def _fallback_parse(self, text: str, user_context: Dict) -> Dict:
         """Fallback to simple parsing if API fails"""
-        import re
-        
         text_lower = text.lower()
+        words = frozenset(_WORD_RE.findall(text_lower))
         result = {
             "leave_type": user_context.get("leave_type"),
             "start_date": user_context.get("start_date"),
@@ -131,28 +139,26 @@ Respond ONLY with valid JSON:
         
         # Extract leave type
         if not result["leave_type"]:
-            if "sick" in text_lower or "ill" in text_lower or "unwell" in text_lower:
-                result["leave_type"] = LeaveType.SICK
-            elif "casual" in text_lower or "personal" in text_lower:
-                result["leave_type"] = LeaveType.CASUAL
-            elif "annual" in text_lower or "vacation" in text_lower:
-                result["leave_type"] = LeaveType.ANNUAL
+            result["leave_type"] = next(
+                (leave_type for keyword, leave_type in _LEAVE_TYPE_KEYWORDS.items() if keyword in words), None
+            )
         
-        # Extract dates
+        # Extract dates; read the clock once for the whole parse
         today = datetime.now().date()
+        tomorrow = today + timedelta(days=1)
         if "tomorrow" in text_lower:
-            result["start_date"] = today + timedelta(days=1)
-            result["end_date"] = today + timedelta(days=1)
+            result["start_date"] = tomorrow
+            result["end_date"] = tomorrow
         elif "today" in text_lower:
             result["start_date"] = today
             result["end_date"] = today
         
         # Duration
-        days_match = re.search(r'(\d+)\s*day', text_lower)
+        days_match = _DAYS_RE.search(text_lower)
         if days_match:
             num_days = int(days_match.group(1))
             if not result["start_date"]:
-                result["start_date"] = today + timedelta(days=1)
+                result["start_date"] = tomorrow
             result["end_date"] = result["start_date"] + timedelta(days=num_days - 1)
         
         result = self._check_completeness(result)
@@ -238,7 +244,7 @@ Keep responses concise but warm - max 2-3 sentences."""
         
         user_prompt = f"""
 CONTEXT:
-{json.dumps(context_info, indent=2, default=str)}
+{orjson.dumps(context_info, default=str, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode()}
 
 EXTRACTED LEAVE DATA:
 - Complete: {result.get('is_complete', False)}
@@ -270,11 +276,11 @@ Please generate a natural response:"""
             )
             
             if response.status_code == 200:
-                ai_response = response.json()["choices"][0]["message"]["content"]
+                ai_response = orjson.loads(response.content)["choices"][0]["message"]["content"]
                 return ai_response.strip()
                 
         except Exception as e:
-            print(f"AI response generation failed: {e}")
+            logger.warning("AI response generation failed: %s", e)
         
         # Fallback to original static responses
         return self._static_fallback_response(result, suggested_persons)
@@ -285,18 +291,22 @@ Please generate a natural response:"""
             duration = (result["end_date"] - result["start_date"]).days + 1
             leave_type = result['leave_type'].value.lower() if hasattr(result['leave_type'], 'value') else str(result['leave_type']).lower()
             
-            response = f"✅ Got it! Your {leave_type} leave is set for {duration} day{'s' if duration > 1 else ''}:\n"
-            response += f"📅 {result['start_date'].strftime('%b %d')} - {result['end_date'].strftime('%b %d')}\n"
+            parts = [
+                f"✅ Got it! Your {leave_type} leave is set for {duration} day{'s' if duration > 1 else ''}:\n",
+                f"📅 {result['start_date'].strftime('%b %d')} - {result['end_date'].strftime('%b %d')}\n"
+            ]
             
             if suggested_persons:
-                response += f"\n🤝 Suggested handover contacts:\n"
-                for i, person in enumerate(suggested_persons[:3], 1):
-                    response += f"{i}. {person['name']} ({person['position']})\n"
-                response += "\nReply with a number or 'submit' to proceed!"
+                parts.append("\n🤝 Suggested handover contacts:\n")
+                parts.extend(
+                    f"{i}. {person['name']} ({person['position']})\n"
+                    for i, person in enumerate(suggested_persons[:3], 1)
+                )
+                parts.append("\nReply with a number or 'submit' to proceed!")
             else:
-                response += "\nType 'submit' to finalize! 🚀"
+                parts.append("\nType 'submit' to finalize! 🚀")
             
-            return response
+            return "".join(parts)
         
         return result.get("clarification_question", "Could you tell me more about your leave request?")
 
@@ -351,10 +361,10 @@ Generate a brief, helpful message about the team impact:"""
             )
             
             if response.status_code == 200:
-                return response.json()["choices"][0]["message"]["content"].strip()
+                return orjson.loads(response.content)["choices"][0]["message"]["content"].strip()
                 
         except Exception as e:
-            print(f"Impact message generation failed: {e}")
+            logger.warning("Impact message generation failed: %s", e)
         
         # Fallback
         level = impact_data['level']
@@ -371,7 +381,7 @@ Generate a brief, helpful message about the team impact:"""
         score = 0
         factors = []
         
-        overlapping = len([t for t in team_data if t.get("on_leave")])
+        overlapping = sum(1 for t in team_data if t.get("on_leave"))
         if overlapping > 0:
             score += overlapping * 20
             factors.append(f"{overlapping} team member(s) on leave")
@@ -1,10 +1,13 @@
+import logging
 from datetime import datetime, timedelta, date
 from typing import Dict, List
-import json
+import orjson
 import requests
 from collections import defaultdict, Counter
 from app.config import settings
 
+logger = logging.getLogger(__name__)
+
 class AnalyticsAIService:
     """AI-powered analytics service for actionable insights"""
     
@@ -395,10 +398,10 @@ LEAVE ANALYTICS SUMMARY:
 - Average Duration: {summary.get('avg_duration', 0)} days
 
 KEY TRENDS:
-{json.dumps(trends, indent=2, default=str)}
+{orjson.dumps(trends, default=str, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode()}
 
 PREDICTIONS:
-{json.dumps(predictions, indent=2, default=str)}
+{orjson.dumps(predictions, default=str, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode()}
 
 RISKS IDENTIFIED:
 - Critical: {len(risks.get('critical_risks', []))}
@@ -434,11 +437,11 @@ Be direct and focus on what matters most for HR decision-making. Avoid generic s
             )
             
             if response.status_code == 200:
-                ai_response = response.json()["choices"][0]["message"]["content"]
+                ai_response = orjson.loads(response.content)["choices"][0]["message"]["content"]
                 return ai_response.strip()
                 
         except Exception as e:
-            print(f"AI insights generation failed: {e}")
+            logger.warning("AI insights generation failed: %s", e)
         
         # Fallback insights
         insights = []
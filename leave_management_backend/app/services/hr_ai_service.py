@@ -1,17 +1,20 @@
+import logging
 from datetime import datetime, timedelta, date
 from typing import Dict, List, Optional
-import json
+import orjson
 import os
 import requests
 from app.models.leave import LeaveType, LeaveStatus
 from app.config import settings  # Import your settings
 
+logger = logging.getLogger(__name__)
+
 class HRAIService:
     """AI Service for HR conversational queries"""
     
     def __init__(self):
         self.groq_api_key = settings.GROQ_API_KEY  # Use settings instead of os.getenv
-        print("GROQ_API_KEY loaded:", "Yes" if self.groq_api_key else "No")
+        logger.debug("GROQ_API_KEY loaded: %s", "Yes" if self.groq_api_key else "No")
         self.api_url = "https://api.groq.com/openai/v1/chat/completions"
     
     def parse_hr_query(
@@ -31,7 +34,7 @@ class HRAIService:
         
         system_prompt = f"""You are an AI assistant for HR personnel managing employee leaves.
 
-Today's date: {today.strftime('%Y-%m-%d')} ({today.strftime('%A')})
+Today's date: {today.isoformat()} ({today.strftime('%A')})
 Available departments: Frontend, Backend, HR, Design
 
 Your job is to parse HR queries and extract:
@@ -71,8 +74,8 @@ EXAMPLES:
 - "Check Sarah's leave balance" → intent: CHECK_BALANCES, employee_name: Sarah
 
 DATE PARSING:
-- "today" = {today.strftime('%Y-%m-%d')}
-- "tomorrow" = {(today + timedelta(days=1)).strftime('%Y-%m-%d')}
+- "today" = {today.isoformat()}
+- "tomorrow" = {(today + timedelta(days=1)).isoformat()}
 - "this week" = THIS_WEEK
 - "last Monday" = calculate date
 - "October 5" = convert to {today.year}-10-05
@@ -124,27 +127,27 @@ Respond ONLY with valid JSON:
             )
             
             if response.status_code == 200:
-                result = response.json()
-                parsed = json.loads(result["choices"][0]["message"]["content"])
+                result = orjson.loads(response.content)
+                parsed = orjson.loads(result["choices"][0]["message"]["content"])
                 
                 # Convert date strings to date objects if present
                 if parsed.get("date_filter") and parsed["date_filter"].get("start_date"):
-                    parsed["date_filter"]["start_date"] = datetime.strptime(
-                        parsed["date_filter"]["start_date"], "%Y-%m-%d"
-                    ).date()
+                    parsed["date_filter"]["start_date"] = date.fromisoformat(
+                        parsed["date_filter"]["start_date"]
+                    )
                 
                 if parsed.get("date_filter") and parsed["date_filter"].get("end_date"):
-                    parsed["date_filter"]["end_date"] = datetime.strptime(
-                        parsed["date_filter"]["end_date"], "%Y-%m-%d"
-                    ).date()
+                    parsed["date_filter"]["end_date"] = date.fromisoformat(
+                        parsed["date_filter"]["end_date"]
+                    )
                 
                 return parsed
             
             else:
-                print(f"Groq API Error: {response.status_code} - {response.text}")
+                logger.warning("Groq API Error: %s - %s", response.status_code, response.text)
                 
         except Exception as e:
-            print(f"Error calling Groq API: {e}")
+            logger.warning("Error calling Groq API: %s", e)
         
         # Fallback to simple parsing
         return self._fallback_parse(text)
@@ -242,10 +245,10 @@ Keep responses concise but informative - max 4-5 sentences unless complex data."
         # Build context-aware prompt
         user_prompt = f"""
 INTENT: {intent}
-PARSED QUERY: {json.dumps(parsed, indent=2, default=str)}
+PARSED QUERY: {orjson.dumps(parsed, default=str, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode()}
 
 DATA RETURNED:
-{json.dumps(data, indent=2, default=str)}
+{orjson.dumps(data, default=str, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode()}
 
 Generate a natural, helpful response for the HR person.
 
@@ -278,11 +281,11 @@ Be specific with numbers and names."""
             )
             
             if response.status_code == 200:
-                ai_response = response.json()["choices"][0]["message"]["content"]
+                ai_response = orjson.loads(response.content)["choices"][0]["message"]["content"]
                 return ai_response.strip()
                 
         except Exception as e:
-            print(f"AI response generation failed: {e}")
+            logger.warning("AI response generation failed: %s", e)
         
         # Fallback to structured response
         return self._generate_fallback_response(parsed, data)
@@ -338,7 +341,7 @@ Keep it concise - 3-4 key insights max."""
 
         user_prompt = f"""
 ANALYTICS DATA:
-{json.dumps(analytics_data, indent=2, default=str)}
+{orjson.dumps(analytics_data, default=str, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode()}
 
 Provide key insights and recommendations:"""
 
@@ -362,9 +365,9 @@ Provide key insights and recommendations:"""
             )
             
             if response.status_code == 200:
-                return response.json()["choices"][0]["message"]["content"].strip()
+                return orjson.loads(response.content)["choices"][0]["message"]["content"].strip()
                 
         except Exception as e:
-            print(f"Insight generation failed: {e}")
+            logger.warning("Insight generation failed: %s", e)
         
         return "Analytics data retrieved. Review the charts for detailed patterns."
\ No newline at end of file
@@ -1,7 +1,11 @@
+import logging
+import orjson
 import requests
 from typing import List
 import numpy as np
 
+logger = logging.getLogger(__name__)
+
 class PolicyEmbeddingService:
     """Generate embeddings for policy chunks using Groq"""
     
@@ -43,7 +47,7 @@ class PolicyEmbeddingService:
             )
             
             if response.status_code == 200:
-                result = response.json()
+                result = orjson.loads(response.content)
                 keywords = result["choices"][0]["message"]["content"]
                 
                 # Create a simple embedding based on text characteristics
@@ -54,7 +58,7 @@ class PolicyEmbeddingService:
             return self._create_simple_embedding(text)
             
         except Exception as e:
-            print(f"Embedding generation failed: {e}")
+            logger.warning("Embedding generation failed: %s", e)
             return self._create_simple_embedding(text)
     
     def _create_simple_embedding(self, text: str, keywords: str = "") -> List[float]:
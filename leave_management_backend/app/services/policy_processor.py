@@ -1,10 +1,6 @@
-import PyPDF2
-import mammoth
 import io
 from typing import List, Dict
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-import numpy as np
-import json
 
 class PolicyProcessor:
     """Extract and chunk policy documents"""
@@ -32,18 +28,21 @@ class PolicyProcessor:
     
     def _extract_from_pdf(self, content: bytes) -> str:
         """Extract text from PDF"""
+        # Parser libraries load on the first upload of their format, not at startup
+        import PyPDF2
+        
         pdf_file = io.BytesIO(content)
         pdf_reader = PyPDF2.PdfReader(pdf_file)
         
-        text = ""
-        for page_num, page in enumerate(pdf_reader.pages, 1):
-            page_text = page.extract_text()
-            text += f"\n--- Page {page_num} ---\n{page_text}\n"
-        
-        return text
+        return "".join(
+            f"\n--- Page {page_num} ---\n{page.extract_text()}\n"
+            for page_num, page in enumerate(pdf_reader.pages, 1)
+        )
     
     def _extract_from_docx(self, content: bytes) -> str:
         """Extract text from DOCX"""
+        import mammoth
+        
         docx_file = io.BytesIO(content)
         result = mammoth.extract_raw_text(docx_file)
         return result.value
@@ -1,10 +1,16 @@
+import logging
 from sqlalchemy.orm import Session
 from typing import List, Dict
 import numpy as np
-import json
+import orjson
 from app.services.policy_embedding_service import PolicyEmbeddingService
 import requests
 
+logger = logging.getLogger(__name__)
+
+# Length of the content_preview attached to retrieved chunks
+CONTENT_PREVIEW_CHARS = 300
+
 class PolicyRAGService:
     """RAG service for policy compliance checking"""
     
@@ -41,7 +47,7 @@ class PolicyRAGService:
             if not chunk.embedding:
                 continue
             
-            chunk_embedding = json.loads(chunk.embedding)
+            chunk_embedding = orjson.loads(chunk.embedding)
             similarity = self._cosine_similarity(query_embedding, chunk_embedding)
             
             similarities.append({
@@ -55,7 +61,12 @@ class PolicyRAGService:
         
         # Sort by similarity and return top k
         similarities.sort(key=lambda x: x["similarity"], reverse=True)
-        return similarities[:top_k]
+        top = similarities[:top_k]
+        
+        # Replies only ever show the start of a chunk, truncate once here
+        for item in top:
+            item["content_preview"] = item["content"][:CONTENT_PREVIEW_CHARS]
+        return top
     
     def _cosine_similarity(self, vec1: List[float], vec2: List[float]) -> float:
         """Calculate cosine similarity between two vectors"""
@@ -147,9 +158,9 @@ class PolicyRAGService:
         # Calculate duration
         if start_date and end_date:
             if isinstance(start_date, str):
-                from datetime import datetime
-                start_date = datetime.strptime(start_date, "%Y-%m-%d").date()
-                end_date = datetime.strptime(end_date, "%Y-%m-%d").date()
+                from datetime import date
+                start_date = date.fromisoformat(start_date)
+                end_date = date.fromisoformat(end_date)
             duration = (end_date - start_date).days + 1
         else:
             duration = 1
@@ -238,9 +249,9 @@ EXAMPLES:
             )
             
             if response.status_code == 200:
-                result = response.json()
+                result = orjson.loads(response.content)
                 content = result["choices"][0]["message"]["content"]
-                analysis = json.loads(content)
+                analysis = orjson.loads(content)
                 
                 # Enhanced post-processing: Remove false positives
                 if analysis.get("violations"):
@@ -325,10 +336,10 @@ EXAMPLES:
                 
                 return analysis
             else:
-                print(f"Groq API error: {response.status_code} - {response.text}")
+                logger.warning("Groq API error: %s - %s", response.status_code, response.text)
             
         except Exception as e:
-            print(f"AI compliance check failed: {e}")
+            logger.warning("AI compliance check failed: %s", e)
         
         # Fallback: Apply basic rule-based checking
         return self._rule_based_compliance_check(leave_request, policies, user_context)
@@ -355,9 +366,9 @@ EXAMPLES:
         end_date = leave_request.get('end_date')
         if start_date and end_date:
             if isinstance(start_date, str):
-                from datetime import datetime
-                start_date = datetime.strptime(start_date, "%Y-%m-%d").date()
-                end_date = datetime.strptime(end_date, "%Y-%m-%d").date()
+                from datetime import date
+                start_date = date.fromisoformat(start_date)
+                end_date = date.fromisoformat(end_date)
             duration = (end_date - start_date).days + 1
         else:
             duration = 1
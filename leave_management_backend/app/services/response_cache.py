@@ -0,0 +1,217 @@
+import copy
+import hashlib
+import importlib.util
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+import numpy as np
+
+# Optional; the cache falls back to hashed trigrams. Only probe for it here,
+# importing it pulls in torch, which is deferred to the first semantic lookup
+_HAS_SENTENCE_TRANSFORMERS = importlib.util.find_spec("sentence_transformers") is not None
+
+
+logger = logging.getLogger(__name__)
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s]")
+# Ids, numbers and capitalized names after the first word; one differing digit
+# or letter barely moves either embedding, so such texts only match exactly
+_ENTITY_RE = re.compile(r"\d|(?<=\s)[A-Z]")
+
+# Sentence embeddings catch paraphrases trigrams miss ("sick leave for tomorrow
+# please" vs "I need sick leave tomorrow"); loaded once per process, on first use
+_SENTENCE_MODEL_NAME = "all-MiniLM-L6-v2"
+_sentence_model = None
+_sentence_model_failed = False
+_sentence_model_lock = threading.Lock()
+
+
+def _get_sentence_model():
+    """The shared SentenceTransformer, or None if it isn't installed or fails to load"""
+    global _sentence_model, _sentence_model_failed
+    if not _HAS_SENTENCE_TRANSFORMERS or _sentence_model_failed:
+        return None
+    if _sentence_model is None:
+        with _sentence_model_lock:
+            if _sentence_model is None and not _sentence_model_failed:
+                try:
+                    from sentence_transformers import SentenceTransformer
+                    _sentence_model = SentenceTransformer(_SENTENCE_MODEL_NAME)
+                except Exception as e:
+                    logger.warning("Sentence embedding model unavailable, using trigrams: %s", e)
+                    _sentence_model_failed = True
+    return _sentence_model
+
+
+class ResponseCache:
+    """Two-tier cache for parsed conversation results.
+
+    Tier 1 is an exact match on sha256(role|context|normalized text). Tier 2 is
+    a semantic match on a local embedding within the same role and context, so
+    near-duplicate phrasings reuse the same entry. The context is an opaque
+    string for whatever else the value depends on (e.g. the recent chat turns). The embedding is MiniLM when sentence-transformers is installed,
+    otherwise a hashed character-trigram vector (typos, plurals). Texts naming
+    an entity (digits, capitalized words) are kept out of tier 2 entirely.
+    """
+
+    EMBEDDING_DIM = 512
+    # Sentence embeddings score paraphrases lower than trigrams score typos
+    SENTENCE_THRESHOLD = 0.92
+    TRIGRAM_THRESHOLD = 0.95
+
+    def __init__(self, ttl: int = 3600, max_entries: int = 1024,
+                 similarity_threshold: Optional[float] = None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold  # None: pick per embedding
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (stored_at, scope, vector, value)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Lowercase, drop punctuation and collapse whitespace"""
+        return " ".join(_PUNCTUATION_RE.sub("", text.lower()).split())
+
+    @staticmethod
+    def make_key(role: str, text: str, context: str = "") -> str:
+        return hashlib.sha256(f"{role}|{context}|{ResponseCache.normalize(text)}".encode()).hexdigest()
+
+    def _embed(self, text: str) -> np.ndarray:
+        """L2-normalized embedding of the normalized text"""
+        model = _get_sentence_model()
+        if model is not None:
+            return model.encode(self.normalize(text), normalize_embeddings=True).astype(np.float32)
+        return self._embed_trigrams(text)
+
+    def _embed_trigrams(self, text: str) -> np.ndarray:
+        """Hash character trigrams into a fixed-size, L2-normalized vector"""
+        padded = f"  {self.normalize(text)} "
+        vector = np.zeros(self.EMBEDDING_DIM, dtype=np.float32)
+        for i in range(len(padded) - 2):
+            digest = hashlib.md5(padded[i:i + 3].encode()).digest()
+            vector[int.from_bytes(digest[:4], "little") % self.EMBEDDING_DIM] += 1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    @property
+    def uses_sentence_model(self) -> bool:
+        """True when semantic lookups run a model forward pass rather than trigram hashing"""
+        return _get_sentence_model() is not None
+
+    def get(self, role: str, text: str, context: str = "") -> Optional[Dict]:
+        """Return a copy of the cached value for (role, context, text), or None on miss"""
+        value = self.get_exact(role, text, context)
+        if value is None:
+            value = self.get_semantic(role, text, context)
+        return value
+
+    def get_exact(self, role: str, text: str, context: str = "") -> Optional[Dict]:
+        """Tier 1 only: exact match on the normalized text"""
+        key = self.make_key(role, text, context)
+        now = time.time()
+
+        with self._lock:
+            self._evict_expired(now)
+
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            # Callers mutate parsed results, never hand out the stored object
+            return copy.deepcopy(entry[3])
+
+    @staticmethod
+    def has_entities(text: str) -> bool:
+        """True if the text carries ids or names that must match exactly"""
+        return _ENTITY_RE.search(text.strip()) is not None
+    
+    def get_semantic(self, role: str, text: str, context: str = "") -> Optional[Dict]:
+        """Tier 2 only: nearest stored embedding for the same role and context"""
+        if self.has_entities(text):
+            return None
+        # Embed outside the lock; a model forward pass shouldn't serialize lookups
+        vector = self._embed(text)
+        with self._lock:
+            entry = self._semantic_lookup(f"{role}|{context}", vector)
+            if entry is None:
+                return None
+            return copy.deepcopy(entry[3])
+
+    def set(self, role: str, text: str, value: Dict, context: str = "") -> None:
+        key = self.make_key(role, text, context)
+        # No vector for entity texts: exact hits only
+        vector = None if self.has_entities(text) else self._embed(text)
+        entry = (time.time(), f"{role}|{context}", vector, copy.deepcopy(value))
+
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _semantic_lookup(self, scope: str, vector: np.ndarray) -> Optional[tuple]:
+        # Vector size changes if the model failed to load after entries were stored
+        candidates = [
+            (k, e) for k, e in self._entries.items()
+            if e[1] == scope and e[2] is not None and e[2].shape == vector.shape
+        ]
+        if not candidates:
+            return None
+
+        matrix = np.stack([e[2] for _, e in candidates])
+        similarities = matrix @ vector
+        best = int(np.argmax(similarities))
+        threshold = self.similarity_threshold
+        if threshold is None:
+            threshold = self.TRIGRAM_THRESHOLD if len(vector) == self.EMBEDDING_DIM else self.SENTENCE_THRESHOLD
+        if similarities[best] < threshold:
+            return None
+
+        key, entry = candidates[best]
+        self._entries.move_to_end(key)
+        return entry
+
+    def _evict_expired(self, now: float) -> None:
+        # Order is by last access, not insertion, so scan the whole (bounded) map
+        expired = [k for k, e in self._entries.items() if now - e[0] > self.ttl]
+        for k in expired:
+            del self._entries[k]
+
+
+class TTLCache:
+    """Exact-match LRU cache whose entries expire after ttl seconds"""
+
+    def __init__(self, ttl: int = 60, max_entries: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (stored_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry[0] > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value) -> None:
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
@@ -1,37 +1,52 @@
+import logging
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 import hashlib
+import hmac
 import secrets
 from app.config import settings
 
+logger = logging.getLogger(__name__)
+
+# Stored as pbkdf2$<iterations>$<salt hex>$<hash hex>, so the count can be
+# raised later without invalidating existing hashes
+_PBKDF2_PREFIX = "pbkdf2$"
+_PBKDF2_ITERATIONS = 200_000
+
+def _pbkdf2(password: str, salt: bytes, iterations: int) -> bytes:
+    return hashlib.pbkdf2_hmac("sha256", password.encode(), salt, iterations, dklen=32)
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against a hash"""
     # Extract salt and hash
     try:
-        if ':' in hashed_password:
+        if hashed_password.startswith(_PBKDF2_PREFIX):
+            _, iterations, salt, stored_hash = hashed_password.split('$')
+            password_hash = _pbkdf2(plain_password, bytes.fromhex(salt), int(iterations))
+            return hmac.compare_digest(password_hash, bytes.fromhex(stored_hash))
+        elif ':' in hashed_password:
+            # Legacy salted SHA-256
             salt, stored_hash = hashed_password.split(':')
             password_hash = hashlib.sha256((plain_password + salt).encode()).hexdigest()
-            return password_hash == stored_hash
+            return hmac.compare_digest(password_hash, stored_hash)
         else:
             # Legacy support - direct hash comparison
             password_hash = hashlib.sha256(plain_password.encode()).hexdigest()
-            return password_hash == hashed_password
+            return hmac.compare_digest(password_hash, hashed_password)
     except Exception as e:
-        print(f"Password verification error: {e}")
+        logger.warning("Password verification error: %s", e)
         return False
 
 def get_password_hash(password: str) -> str:
-    """Hash a password with salt"""
+    """Hash a password with a random salt using PBKDF2-HMAC-SHA256"""
     try:
         # Generate a random salt
-        salt = secrets.token_hex(16)
-        # Create hash with salt
-        password_hash = hashlib.sha256((password + salt).encode()).hexdigest()
-        # Return salt:hash format
-        return f"{salt}:{password_hash}"
+        salt = secrets.token_bytes(16)
+        password_hash = _pbkdf2(password, salt, _PBKDF2_ITERATIONS)
+        return f"{_PBKDF2_PREFIX}{_PBKDF2_ITERATIONS}${salt.hex()}${password_hash.hex()}"
     except Exception as e:
-        print(f"Password hashing error: {e}")
+        logger.error("Password hashing error: %s", e)
         # Fallback to simple hash
         return hashlib.sha256(password.encode()).hexdigest()
 
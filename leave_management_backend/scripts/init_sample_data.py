@@ -5,10 +5,24 @@ from app.models.leave import LeaveType
 from app.utils.security import get_password_hash
 from datetime import datetime
 
+# Printed in one write once the data is in
+_SUMMARY = """Sample data initialized successfully!
+
+Sample Users:
+1. Manager - username: manager, password: password123
+2. Employee - username: employee, password: password123
+3. HR - username: hr, password: password123"""
+
 def init_sample_data():
     init_db()
     db = SessionLocal()
     
+    # Re-runs stop here, before the password hashing and the duplicate-email failure
+    if db.query(User.id).filter(User.username == "manager").first() is not None:
+        db.close()
+        print("Sample data already present, nothing to do.")
+        return
+    
     # Create sample users
     users = [
         User(
@@ -48,27 +62,24 @@ def init_sample_data():
     current_year = datetime.now().year
     leave_types = [LeaveType.CASUAL, LeaveType.SICK, LeaveType.ANNUAL]
     
-    for user in users:
-        if user.role == "EMPLOYEE":
-            for leave_type in leave_types:
-                balance = LeaveBalance(
-                    employee_id=user.id,
-                    year=current_year,
-                    leave_type=leave_type,
-                    total_allocated=10 if leave_type == LeaveType.CASUAL else 15,
-                    used=0,
-                    available=10 if leave_type == LeaveType.CASUAL else 15
-                )
-                db.add(balance)
+    # Plain mappings in one executemany INSERT; nothing reads these back as ORM objects
+    db.bulk_insert_mappings(LeaveBalance, [
+        {
+            "employee_id": user.id,
+            "year": current_year,
+            "leave_type": leave_type,
+            "total_allocated": 10 if leave_type == LeaveType.CASUAL else 15,
+            "used": 0,
+            "available": 10 if leave_type == LeaveType.CASUAL else 15
+        }
+        for user in users if user.role == "EMPLOYEE"
+        for leave_type in leave_types
+    ])
     
     db.commit()
     db.close()
     
-    print("Sample data initialized successfully!")
-    print("\nSample Users:")
-    print("1. Manager - username: manager, password: password123")
-    print("2. Employee - username: employee, password: password123")
-    print("3. HR - username: hr, password: password123")
+    print(_SUMMARY)
 
 if __name__ == "__main__":
     init_sample_data()
\ No newline at end of file